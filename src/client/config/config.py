@@ -16,6 +16,8 @@ class Config:
         "default_order_size": 0.01,
         "default_algo_range": 10,
         "data_refresh_interval": 10,  # seconds
+        "bar_timeframes": ["1s", "1m", "5m"],
+        "bar_history": 1000,  # bars retained per timeframe
     }
     
     def __init__(self, config_file: str = None):
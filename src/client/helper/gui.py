@@ -6,6 +6,7 @@ import time
 import logging
 from helper.npipe import NamedPipe
 from models.market_data import MarketData
+from models.bars import BarBuilder
 
 class ManualMode:
     def __init__(self, config):
@@ -26,6 +27,10 @@ class ManualMode:
         
         # Initialize market data
         self.market_data = None
+        self.bars = BarBuilder(
+            timeframes=config.get("bar_timeframes", ["1s", "1m", "5m"]),
+            capacity=config.get("bar_history", 1000)
+        )
         
         # Setup the connection status checker
         self.connection_status = tk.StringVar(value="Not Connected")
@@ -181,6 +186,9 @@ class ManualMode:
                         info_text.append(f"Bid: {market_info['bid']} | Ask: {market_info['ask']}")
                     if "last" in market_info:
                         info_text.append(f"Last price: {market_info['last']}")
+                    if "bid" in market_info and "ask" in market_info:
+                        self.bars.add_quote(time.time(), market_info["bid"], market_info["ask"],
+                                            market_info.get("last"))
                 
                 if account_info:
                     if "balance" in account_info:
@@ -0,0 +1,541 @@
+# MM2/src/client/helper/loadtest.py
+import win32pipe, win32file, win32api, win32process, pywintypes
+import sys
+import json
+import math
+import time
+import random
+import ctypes
+import logging
+import argparse
+import threading
+from array import array
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.config import Config
+from helper.npipe import NamedPipe
+from utils.logging import setup_logging
+
+DEFAULT_MIX = {"refresh": 70, "limit": 10, "mid_price": 10, "algo": 10}
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with constant memory.
+
+    Samples are never stored individually, so an 8-hour soak does not grow
+    the process and skew the RSS numbers it is trying to measure.
+    """
+
+    def __init__(self, lowest: float = 1e-5, highest: float = 600.0, precision: float = 0.01):
+        """
+        Args:
+            lowest: Smallest distinguishable latency in seconds
+            highest: Latencies above this are clamped into the last bucket
+            precision: Relative bucket width, 0.01 gives ~1% accurate percentiles
+        """
+        self.lowest = lowest
+        self.log_base = math.log1p(precision)
+        self.buckets = array('Q', bytes(8 * (self._index(highest) + 1)))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.lowest:
+            return 0
+        return int(math.log(value / self.lowest) / self.log_base) + 1
+
+    def record(self, value: float) -> None:
+        """Add a latency sample in seconds."""
+        self.buckets[min(self._index(value), len(self.buckets) - 1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Add another histogram with the same layout into this one."""
+        for i, n in enumerate(other.buckets):
+            if n:
+                self.buckets[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the ``pct`` percentile."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(self.lowest * math.exp(i * self.log_base), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+class StandInServer:
+    """
+    Stand-in for the MQL5 backend on one named pipe.
+
+    Connects to a pipe created by NamedPipe and answers the same commands
+    as backend.mqh with canned data. Injected connection drops exercise the
+    client retry and reconnect path; slow responses only add latency, as
+    NamedPipe reads without a timeout; error responses count as errors.
+    """
+
+    def __init__(self, pipe_name: str, latency: float = 0.0, slow_rate: float = 0.0,
+                 slow_delay: float = 1.0, drop_rate: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize the stand-in server.
+
+        Args:
+            pipe_name: Pipe to connect to, as created by the client
+            latency: Base processing time per command in seconds
+            slow_rate: Fraction of commands delayed by an extra ``slow_delay``
+            slow_delay: Extra delay in seconds for slow commands
+            drop_rate: Fraction of commands answered by closing the pipe
+            error_rate: Fraction of order commands answered with an error
+            seed: Random seed for reproducible fault injection
+        """
+        self.pipe_name = pipe_name
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.drop_rate = drop_rate
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.handle = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.bid = 1.10000
+        self.drops = self.slow = self.errors = self.handled = 0
+        self.logger = logging.getLogger(__name__)
+
+    def start(self) -> None:
+        """Start serving on a background thread."""
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the pipe."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        self._disconnect()
+
+    def _connect(self) -> bool:
+        """Open the client's pipe, as FileOpen does in npipe.mqh."""
+        try:
+            win32pipe.WaitNamedPipe(self.pipe_name, 100)
+            self.handle = win32file.CreateFile(
+                self.pipe_name,
+                win32file.GENERIC_READ | win32file.GENERIC_WRITE,
+                0, None, win32file.OPEN_EXISTING, 0, None)
+            win32pipe.SetNamedPipeHandleState(self.handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
+            return True
+        except pywintypes.error:
+            # Pipe not created yet (client is between retries)
+            self.handle = None
+            time.sleep(0.01)
+            return False
+
+    def _disconnect(self) -> None:
+        if self.handle is not None:
+            try:
+                win32file.CloseHandle(self.handle)
+            except pywintypes.error:
+                pass
+            self.handle = None
+
+    def serve(self) -> None:
+        """Read commands and write responses until stopped."""
+        while not self.stop_event.is_set():
+            if self.handle is None and not self._connect():
+                continue
+            try:
+                data = win32file.ReadFile(self.handle, 64*1024)[1]
+            except pywintypes.error:
+                self._disconnect()
+                continue
+
+            if self.rng.random() < self.drop_rate:
+                self.drops += 1
+                self.logger.debug(f"Injected drop on {self.pipe_name}")
+                self._disconnect()
+                continue
+
+            delay = self.latency
+            if self.rng.random() < self.slow_rate:
+                self.slow += 1
+                delay += self.slow_delay
+            if delay:
+                time.sleep(delay)
+
+            response = self._process_command(data)
+            try:
+                # Backend sends a NUL-terminated string, see NamedPipe.Send
+                win32file.WriteFile(self.handle, json.dumps(response).encode('utf-8') + b"\x00")
+                self.handled += 1
+            except pywintypes.error:
+                self._disconnect()
+
+    def _process_command(self, data: bytes) -> Dict[str, Any]:
+        """Build a response shaped like Backend._ProcessCommand."""
+        try:
+            command = json.loads(data.decode('utf-8')).get("command", "")
+        except ValueError:
+            command = ""
+
+        if command == "refresh":
+            self.bid = round(self.bid + self.rng.gauss(0.0, 0.00005), 5)
+            return {"status": "success", "data": {
+                "market_info": {"symbol": "EURUSD", "bid": self.bid, "ask": round(self.bid + 0.00010, 5)},
+                "account_info": {"balance": 10000.00, "equity": 10000.00}}}
+        if command == "algo":
+            return {"status": "success", "message": "Algorithm settings updated"}
+        if command in ("limit", "mid_price"):
+            if self.rng.random() < self.error_rate:
+                self.errors += 1
+                return {"status": "error", "message": "Failed to place order: 10019"}
+            return {"status": "success", "message": "Order placed successfully"}
+        return {"status": "error", "message": f"Unknown command: {command}"}
+
+class LoadStats:
+    """Thread-safe counters and latency histograms per command type."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.sent = 0
+        self.errors = 0
+        self.late = 0
+
+    def record(self, command: str, latency: float, ok: bool, late: bool) -> None:
+        with self.lock:
+            histogram = self.latency.get(command)
+            if histogram is None:
+                histogram = self.latency[command] = LatencyHistogram()
+            histogram.record(latency)
+            self.sent += 1
+            self.errors += not ok
+            self.late += late
+
+    def take(self) -> 'LoadStats':
+        """Return the current counters and start a fresh interval."""
+        snapshot = LoadStats()
+        with self.lock:
+            snapshot.latency, snapshot.sent = self.latency, self.sent
+            snapshot.errors, snapshot.late = self.errors, self.late
+            self.reset()
+        return snapshot
+
+    def combined(self) -> LatencyHistogram:
+        total = LatencyHistogram()
+        for histogram in self.latency.values():
+            total.merge(histogram)
+        return total
+
+def process_usage() -> Tuple[float, int, int]:
+    """Return (RSS in MB, open handle count, thread count) for this process."""
+    process = win32api.GetCurrentProcess()
+    rss = win32process.GetProcessMemoryInfo(process)["WorkingSetSize"] / (1024 * 1024)
+    handles = ctypes.c_ulong()
+    ctypes.windll.kernel32.GetProcessHandleCount(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(handles))
+    return rss, handles.value, threading.active_count()
+
+class LoadGenerator:
+    """
+    Drives a command mix from many simulated clients and reports over time.
+
+    Each simulated client owns a NamedPipe on its own pipe name and sends
+    on a fixed schedule (open loop), so a slow response delays that client
+    but is still measured from the moment the command was due.
+    """
+
+    def __init__(self, pipe_name: str, clients: int = 4, rate: float = 100.0,
+                 duration: float = 60.0, mix: Optional[Dict[str, float]] = None,
+                 report_interval: float = 10.0, retry_interval: float = 5,
+                 max_retries: int = 3, grace: Optional[float] = None,
+                 seed: Optional[int] = None):
+        """
+        Initialize the load generator.
+
+        Args:
+            pipe_name: Base pipe name, client i uses '<pipe_name>_load<i>'
+            clients: Number of concurrent simulated clients
+            rate: Target commands per second across all clients
+            duration: Test length in seconds
+            mix: Relative weights per command type
+            report_interval: Seconds between progress reports
+            retry_interval, max_retries: Passed to each NamedPipe
+            grace: Seconds to wait for clients after ``duration`` before
+                giving up on them, defaults to one full retry cycle plus 5s
+            seed: Random seed for the command mix
+        """
+        self.pipe_names = [f"{pipe_name}_load{i}" for i in range(clients)]
+        self.rate = rate
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.report_interval = report_interval
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.grace = grace if grace is not None else retry_interval * (max_retries + 1) + 5
+        self.seed = seed
+        self.stuck: List[str] = []
+        self.failed: List[str] = []
+        self.pipes: List[NamedPipe] = []
+        self.stats = LoadStats()
+        self.totals = LoadStats()
+        self.reports: List[Dict[str, Any]] = []
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(__name__)
+
+    def _params(self, command: str, rng: random.Random) -> Dict[str, Any]:
+        """Parameters shaped like the ones the GUI sends."""
+        if command == "limit":
+            return {"price": round(1.1 + rng.uniform(-0.01, 0.01), 5), "size": 0.01}
+        if command == "mid_price":
+            return {"size": 0.01, "side": rng.choice(("buy", "sell"))}
+        if command == "algo":
+            return {"range": float(rng.randint(1, 50)), "active": rng.random() < 0.5}
+        return {}
+
+    def _client(self, index: int, pipe: NamedPipe, start: float) -> None:
+        """Connect, then send commands on a fixed schedule until the test ends."""
+        # Connecting here rather than in run() means a missing stand-in
+        # leaves this thread blocked in ConnectNamedPipe and reported as
+        # stuck at the deadline, instead of hanging the whole tool
+        if not pipe.connect():
+            self.logger.error(f"Could not connect {pipe.pipe_name}")
+            self.failed.append(pipe.pipe_name)
+            return
+
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        commands, weights = list(self.mix), list(self.mix.values())
+        interval = len(self.pipe_names) / self.rate
+        due = max(start, time.perf_counter()) + rng.uniform(0, interval)
+
+        while not self.stop_event.is_set() and due < start + self.duration:
+            wait = due - time.perf_counter()
+            late = wait < 0
+            if not late and self.stop_event.wait(wait):
+                break
+
+            command = rng.choices(commands, weights)[0]
+            response = pipe.send_command(command, self._params(command, rng))
+            self.stats.record(command, time.perf_counter() - due,
+                              response.get("status") == "success", late)
+            due += interval
+
+    def _report(self, elapsed: float, retries: int) -> Dict[str, Any]:
+        interval = self.stats.take()
+        with self.totals.lock:
+            for command, histogram in interval.latency.items():
+                self.totals.latency.setdefault(command, LatencyHistogram()).merge(histogram)
+            self.totals.sent += interval.sent
+            self.totals.errors += interval.errors
+            self.totals.late += interval.late
+
+        latency = interval.combined()
+        rss, handles, threads = process_usage()
+        report = {
+            "elapsed": round(elapsed, 1),
+            "throughput": interval.sent / self.report_interval,
+            "p50_ms": latency.percentile(50) * 1000,
+            "p99_ms": latency.percentile(99) * 1000,
+            "max_ms": latency.max * 1000,
+            "error_rate": interval.errors / interval.sent if interval.sent else 0.0,
+            "retries": retries,
+            "late": interval.late,
+            "rss_mb": rss,
+            "handles": handles,
+            "threads": threads,
+        }
+        self.logger.info(
+            f"[{report['elapsed']:>8.1f}s] {report['throughput']:.1f} cmd/s | "
+            f"p50 {report['p50_ms']:.2f} ms | p99 {report['p99_ms']:.2f} ms | "
+            f"errors {report['error_rate'] * 100:.2f}% | retries {retries} | "
+            f"RSS {rss:.1f} MB | handles {handles} | threads {threads}")
+        return report
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run the load test and return a summary.
+
+        Stand-in servers are expected on the pipe names in ``pipe_names``,
+        either in this process or via the 'serve' command. Clients whose
+        stand-in never connects are listed in the summary as stuck.
+        """
+        self.pipes = [NamedPipe(name, self.retry_interval, self.max_retries) for name in self.pipe_names]
+        self.logger.info(f"Starting {len(self.pipes)} client(s)...")
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._client, args=(i, pipe, start), daemon=True)
+                   for i, pipe in enumerate(self.pipes)]
+        for thread in threads:
+            thread.start()
+
+        # A client whose stand-in is missing or gone blocks in ConnectNamedPipe
+        # forever, so stop waiting for clients once the grace period has passed
+        deadline = start + self.duration + self.grace
+        retries_seen = 0
+        try:
+            next_report = start + self.report_interval
+            while any(thread.is_alive() for thread in threads):
+                if time.perf_counter() >= deadline:
+                    self.stop_event.set()
+                    self.stuck = [pipe.pipe_name for pipe, thread in zip(self.pipes, threads)
+                                  if thread.is_alive()]
+                    self.logger.warning(f"{len(self.stuck)} client(s) still blocked after the "
+                                        f"{self.grace:.0f}s grace period, abandoning them")
+                    break
+                time.sleep(max(0.0, min(next_report - time.perf_counter(),
+                                        deadline - time.perf_counter(), 0.5)))
+                if time.perf_counter() >= next_report:
+                    retries = sum(pipe.retries for pipe in self.pipes)
+                    self.reports.append(self._report(next_report - start, retries - retries_seen))
+                    retries_seen = retries
+                    next_report += self.report_interval
+        except KeyboardInterrupt:
+            self.logger.warning("Interrupted, stopping clients")
+            self.stop_event.set()
+            for thread in threads:
+                thread.join(timeout=self.retry_interval * (self.max_retries + 1) + 1)
+        finally:
+            # Stuck clients are daemon threads still blocked on their handle
+            for pipe in self.pipes:
+                if pipe.pipe_name not in self.stuck:
+                    pipe.close()
+
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """Totals over the whole run, including resource growth."""
+        remaining = self.stats.take()
+        for command, histogram in remaining.latency.items():
+            self.totals.latency.setdefault(command, LatencyHistogram()).merge(histogram)
+        self.totals.sent += remaining.sent
+        self.totals.errors += remaining.errors
+        self.totals.late += remaining.late
+
+        latency = self.totals.combined()
+        first = self.reports[0] if self.reports else None
+        last = self.reports[-1] if self.reports else None
+        return {
+            "elapsed": elapsed,
+            "sent": self.totals.sent,
+            "throughput": self.totals.sent / elapsed if elapsed else 0.0,
+            "error_rate": self.totals.errors / self.totals.sent if self.totals.sent else 0.0,
+            "retries": sum(pipe.retries for pipe in self.pipes),
+            "retry_rate": sum(pipe.retries for pipe in self.pipes) / self.totals.sent if self.totals.sent else 0.0,
+            "late": self.totals.late,
+            "stuck_clients": self.stuck,
+            "failed_clients": self.failed,
+            "latency_ms": {
+                name: {p: h.percentile(float(p[1:])) * 1000 for p in ("p50", "p90", "p99", "p99.9")}
+                for name, h in [("all", latency)] + sorted(self.totals.latency.items())
+            },
+            "max_ms": latency.max * 1000,
+            "rss_growth_mb": last["rss_mb"] - first["rss_mb"] if first else 0.0,
+            "handle_growth": last["handles"] - first["handles"] if first else 0,
+            "reports": self.reports,
+        }
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'refresh=70,limit=10' into a weight dictionary."""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def start_servers(pipe_names: List[str], args: argparse.Namespace) -> List[StandInServer]:
+    servers = []
+    for i, name in enumerate(pipe_names):
+        server = StandInServer(
+            name, latency=args.latency, slow_rate=args.slow_rate, slow_delay=args.slow_delay,
+            drop_rate=args.drop_rate, error_rate=args.error_rate,
+            seed=None if args.seed is None else args.seed + i)
+        server.start()
+        servers.append(server)
+    return servers
+
+def main(argv: Optional[List[str]] = None) -> int:
+    settings = Config()
+    parser = argparse.ArgumentParser(description="Load and soak test for the MM2 command protocol")
+    parser.add_argument("mode", choices=("run", "serve"), nargs="?", default="run",
+                        help="'run' drives load (with in-process stand-ins unless --external), "
+                             "'serve' only runs stand-in servers")
+    parser.add_argument("--pipe-name", default=settings.get("pipe_name"))
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=100.0, help="Total commands per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds, e.g. 28800 for 8 hours")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. refresh=70,limit=10,mid_price=10,algo=10")
+    parser.add_argument("--report-interval", type=float, default=10.0)
+    parser.add_argument("--retry-interval", type=float, default=settings.get("retry_interval"))
+    parser.add_argument("--max-retries", type=int, default=settings.get("max_retries"))
+    parser.add_argument("--grace", type=float, default=None,
+                        help="Seconds to wait for blocked clients after --duration")
+    parser.add_argument("--external", action="store_true", help="Stand-in servers run in another process")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stand-in processing time in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of slow responses")
+    parser.add_argument("--slow-delay", type=float, default=1.0, help="Extra seconds for slow responses")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Fraction of commands answered by a drop")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of order commands failing")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Write the JSON summary to this file")
+    args = parser.parse_args(argv)
+
+    setup_logging(settings.get("log_level"), settings.get("log_file"))
+    logger = logging.getLogger(__name__)
+
+    generator = LoadGenerator(
+        args.pipe_name, clients=args.clients, rate=args.rate, duration=args.duration,
+        mix=args.mix, report_interval=args.report_interval, retry_interval=args.retry_interval,
+        max_retries=args.max_retries, grace=args.grace, seed=args.seed)
+
+    servers = [] if args.mode == "run" and args.external else start_servers(generator.pipe_names, args)
+    try:
+        if args.mode == "serve":
+            logger.info(f"Serving {len(servers)} stand-in pipe(s), Ctrl+C to stop")
+            while True:
+                time.sleep(1)
+
+        summary = generator.run()
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        for server in servers:
+            server.stop()
+
+    logger.info(f"Sent {summary['sent']} commands in {summary['elapsed']:.1f}s "
+                f"({summary['throughput']:.1f} cmd/s), errors {summary['error_rate'] * 100:.2f}%, "
+                f"retries {summary['retries']} ({summary['retry_rate'] * 100:.2f}%)")
+    for name, pcts in summary["latency_ms"].items():
+        logger.info(f"  {name:<10} " + " | ".join(f"{p} {v:.2f} ms" for p, v in pcts.items()))
+    logger.info(f"RSS growth {summary['rss_growth_mb']:+.1f} MB, handle growth {summary['handle_growth']:+d}")
+    if summary["failed_clients"]:
+        logger.error(f"Clients failed to create their pipe: {', '.join(summary['failed_clients'])}")
+    if summary["stuck_clients"]:
+        logger.warning(f"Clients never recovered: {', '.join(summary['stuck_clients'])}")
+    if servers:
+        logger.info(f"Injected: {sum(s.drops for s in servers)} drops, {sum(s.slow for s in servers)} slow, "
+                    f"{sum(s.errors for s in servers)} errors")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,6 +23,7 @@ class NamedPipe:
         self.connected = False
         self.retry_interval = retry_interval
         self.max_retries = max_retries
+        self.retries = 0  # Total retries performed by send_command
         self.logger = logging.getLogger(__name__)
 
     def create_pipe(self) -> bool:
@@ -102,6 +103,7 @@ class NamedPipe:
                     return {"status": "error", "message": str(e)}
                 
                 self.logger.info(f"Retrying connection ({retries}/{self.max_retries})...")
+                self.retries += 1
                 self.close()
                 time.sleep(self.retry_interval)
                 self.connect()
@@ -0,0 +1,504 @@
+# MM2/src/client/helper/sweep.py
+import os
+import sys
+import csv
+import json
+import math
+import argparse
+import random
+import logging
+import itertools
+from array import array
+from dataclasses import dataclass, asdict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+from utils.logging import setup_logging
+
+ENTRY_METHODS = ("EM1", "EM2", "EM3")
+
+# Prices per block at each level of the min/max tree
+FANOUT = 8
+
+# Per-worker state, populated once by _init_worker. The shared block holds
+# all concatenated paths plus a FANOUT-ary tree of block extrema:
+# _mins[k][j] is the minimum of the FANOUT**k prices starting at
+# j * FANOUT**k (level 0 is the prices themselves). The tree adds about
+# 2 / (FANOUT - 1) of the price data, and first-touch and excursion
+# lookups skip whole blocks instead of scanning every tick.
+_shm = None
+_sizes: List[int] = []
+_views: List[memoryview] = []
+_mins: List[memoryview] = []
+_maxs: List[memoryview] = []
+_paths: List[Tuple[int, int]] = []
+_grid: List[Sequence] = []
+
+@dataclass
+class SweepResult:
+    """Aggregated outcome of one parameter combination over all price paths."""
+    base: float
+    extreme: float
+    target: float
+    size: float
+    entry_method: str
+    side: str
+    fills: int
+    paths: int
+    fill_rate: float
+    rr: float            # Reward to risk at entry, averaged over fills
+    win_rate: float
+    expectancy: float    # Average realized R per fill
+    pnl: float           # Sum of (exit - entry) * size over all fills
+    max_drawdown: float  # Peak-to-trough of cumulative pnl across paths
+    mae: float           # Average max adverse excursion in R
+
+def frange(start: float, stop: float, step: float) -> List[float]:
+    """Inclusive float range, rounded to the precision of ``step``."""
+    if step <= 0:
+        raise ValueError(f"Step must be positive: {step}")
+    digits = max(0, -int(math.floor(math.log10(step)))) + 2
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return [round(start + i * step, digits) for i in range(max(count, 0))]
+
+def simulate_paths(count: int, length: int, start: float = 1.0,
+                   volatility: float = 0.0005, seed: Optional[int] = None) -> List[List[float]]:
+    """Generate ``count`` random-walk price paths of ``length`` ticks."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        price = start
+        path = []
+        for _ in range(length):
+            price += rng.gauss(0.0, volatility)
+            path.append(price)
+        paths.append(path)
+    return paths
+
+def load_prices(path: str, column: Optional[str] = None,
+                group: Optional[str] = None) -> List[List[float]]:
+    """
+    Load recorded price paths from a JSON or CSV file.
+
+    JSON files hold a list of prices or a list of paths. CSV files need a
+    header; prices are read from ``column`` (default: the first of price,
+    close, last, bid) and split into paths by ``group`` (e.g. a session
+    or date column) if given, otherwise the file is one path.
+    """
+    if path.lower().endswith(".json"):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data and isinstance(data[0], (int, float)):
+            data = [data]
+        return [[float(price) for price in prices] for prices in data]
+
+    with open(path, 'r', newline='') as f:
+        reader = csv.DictReader(f)
+        fields = [name.lower() for name in reader.fieldnames or []]
+        if column is None:
+            column = next((name for name in ("price", "close", "last", "bid") if name in fields), None)
+            if column is None:
+                raise ValueError(f"No price column in {path}, expected one of price/close/last/bid")
+        paths: Dict[str, List[float]] = {}
+        for row in reader:
+            row = {key.lower(): value for key, value in row.items()}
+            paths.setdefault(row[group.lower()] if group else "", []).append(float(row[column.lower()]))
+    return list(paths.values())
+
+def _init_worker(shm_name: str, layout: List[Tuple[int, int]],
+                 paths: List[Tuple[int, int]], grid: List[Sequence]) -> None:
+    """
+    Map the shared price tree into this worker process.
+
+    ``layout`` holds (offset, length) in doubles for the prices, then each
+    min level, then each max level.
+    """
+    global _shm, _views, _mins, _maxs, _sizes, _paths, _grid
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    offset, length = layout[-1]
+    block = _shm.buf[:(offset + length) * 8]
+    _views = [block, block.cast('d')]
+    tables = [_views[1][offset:offset + length] for offset, length in layout]
+    _views.extend(tables)
+    levels = (len(tables) - 1) // 2
+    _mins = tables[:levels + 1]
+    _maxs = tables[:1] + tables[levels + 1:]
+    _sizes = [FANOUT ** k for k in range(levels + 1)]
+    _paths = paths
+    _grid = grid
+
+def _release_worker() -> None:
+    """Drop in-process views of the shared block so it can be closed."""
+    global _shm, _views, _mins, _maxs
+    for view in reversed(_views):
+        view.release()
+    _views, _mins, _maxs = [], [], []
+    if _shm is not None:
+        _shm.close()
+        _shm = None
+
+# The walks below move right from ``lo`` using the largest aligned block
+# that fits before ``hi``: climb a level when aligned to the next block
+# size, drop a level when the block would pass ``hi``, and once a block
+# holds a match, descend into it to find the exact tick.
+
+def _first_at_or_below(price: float, lo: int, hi: int) -> int:
+    """First index in [lo, hi) trading at or below ``price``, else hi."""
+    pos, k, found, top = lo, 0, False, len(_mins) - 1
+    while pos < hi:
+        if not found and k < top and pos % _sizes[k + 1] == 0 and pos + _sizes[k + 1] <= hi:
+            k += 1
+            continue
+        size = _sizes[k]
+        if pos + size > hi:
+            k -= 1
+        elif _mins[k][pos // size] <= price:
+            if not k:
+                return pos
+            found = True
+            k -= 1
+        else:
+            pos += size
+    return hi
+
+def _first_at_or_above(price: float, lo: int, hi: int) -> int:
+    """First index in [lo, hi) trading at or above ``price``, else hi."""
+    pos, k, found, top = lo, 0, False, len(_maxs) - 1
+    while pos < hi:
+        if not found and k < top and pos % _sizes[k + 1] == 0 and pos + _sizes[k + 1] <= hi:
+            k += 1
+            continue
+        size = _sizes[k]
+        if pos + size > hi:
+            k -= 1
+        elif _maxs[k][pos // size] >= price:
+            if not k:
+                return pos
+            found = True
+            k -= 1
+        else:
+            pos += size
+    return hi
+
+def _range_min(lo: int, hi: int) -> float:
+    pos, k, low, top = lo, 0, math.inf, len(_mins) - 1
+    while pos < hi:
+        if k < top and pos % _sizes[k + 1] == 0 and pos + _sizes[k + 1] <= hi:
+            k += 1
+            continue
+        size = _sizes[k]
+        if pos + size > hi:
+            k -= 1
+            continue
+        low = min(low, _mins[k][pos // size])
+        pos += size
+    return low
+
+def _range_max(lo: int, hi: int) -> float:
+    pos, k, high, top = lo, 0, -math.inf, len(_maxs) - 1
+    while pos < hi:
+        if k < top and pos % _sizes[k + 1] == 0 and pos + _sizes[k + 1] <= hi:
+            k += 1
+            continue
+        size = _sizes[k]
+        if pos + size > hi:
+            k -= 1
+            continue
+        high = max(high, _maxs[k][pos // size])
+        pos += size
+    return high
+
+def _combination(index: int) -> Tuple:
+    """Decode a flat grid index into (base, extreme, target, size, method)."""
+    values = []
+    for axis in reversed(_grid):
+        index, i = divmod(index, len(axis))
+        values.append(axis[i])
+    return tuple(reversed(values))
+
+def _evaluate(base: float, extreme: float, target: float, size: float,
+              method: str) -> Optional[SweepResult]:
+    """Simulate one combination on every shared price path."""
+    if target > base > extreme:
+        side, direction = "buy", 1.0
+        adverse, favorable, worst_of = _first_at_or_below, _first_at_or_above, _range_min
+    elif target < base < extreme:
+        side, direction = "sell", -1.0
+        adverse, favorable, worst_of = _first_at_or_above, _first_at_or_below, _range_max
+    else:
+        return None
+
+    # EM1 rests a limit at Base, EM2 rests it halfway into the Base-Extreme
+    # zone, EM3 waits for a touch of Base and enters at the first price
+    # back beyond it, provided Extreme was not hit first. A level can only
+    # be touched once price has traded on its resting side (above it for
+    # a buy), so a path that opens through the level does not fill until
+    # it has come back; the backend never turns such a limit into a
+    # marketable order. EM1/EM2 always fill at the level itself.
+    level = (base + extreme) / 2 if method == "EM2" else base
+    resting = math.nextafter(level, math.inf * direction)
+    reclaim = math.nextafter(base, math.inf * direction)
+    prices = _mins[0]
+
+    fills = wins = 0
+    rr_sum = r_sum = mae_sum = pnl = peak = drawdown = 0.0
+    for start, end in _paths:
+        rest = favorable(resting, start, end)
+        fill = adverse(level, rest + 1, end)
+        if fill >= end:
+            continue
+
+        entry = level
+        if method == "EM3":
+            touch = fill
+            fill = favorable(reclaim, touch + 1, end)
+            if fill >= end or adverse(extreme, touch, fill) < fill:
+                continue
+            entry = prices[fill]
+
+        # The fill tick itself may gap through Extreme; a stop then exits at
+        # the worse of Extreme and the traded price
+        stop_at = adverse(extreme, fill, end)
+        target_at = favorable(target, fill + 1, end)
+        if stop_at < end and stop_at <= target_at:
+            exit_at = stop_at
+            exit_price = min(extreme, prices[stop_at], key=lambda p: p * direction)
+        elif target_at < end:
+            exit_at, exit_price = target_at, target
+        else:
+            exit_at, exit_price = end - 1, prices[end - 1]
+
+        risk = (entry - extreme) * direction
+        worst = worst_of(fill, exit_at + 1)
+        r = (exit_price - entry) * direction / risk
+
+        fills += 1
+        wins += r > 0
+        r_sum += r
+        rr_sum += (target - entry) * direction / risk
+        mae_sum += max((entry - worst) * direction / risk, 0.0)
+        pnl += (exit_price - entry) * direction * size
+        peak = max(peak, pnl)
+        drawdown = max(drawdown, peak - pnl)
+
+    paths = len(_paths)
+    return SweepResult(
+        base=base, extreme=extreme, target=target, size=size,
+        entry_method=method, side=side, fills=fills, paths=paths,
+        fill_rate=fills / paths if paths else 0.0,
+        rr=rr_sum / fills if fills else (target - level) / (level - extreme),
+        win_rate=wins / fills if fills else 0.0,
+        expectancy=r_sum / fills if fills else 0.0,
+        pnl=pnl, max_drawdown=drawdown,
+        mae=mae_sum / fills if fills else 0.0,
+    )
+
+def _run_chunk(bounds: Tuple[int, int]) -> List[SweepResult]:
+    """Evaluate the grid indexes in [start, stop)."""
+    results = []
+    for index in range(*bounds):
+        result = _evaluate(*_combination(index))
+        if result is not None:
+            results.append(result)
+    return results
+
+class ParameterSweep:
+    """Evaluates Base/Extreme/Target/Size/entry method grids over price paths."""
+
+    def __init__(self, prices: Union[Sequence[float], Sequence[Sequence[float]]],
+                 workers: Optional[int] = None, chunksize: Optional[int] = None):
+        """
+        Initialize the sweep with recorded or simulated price data.
+
+        Args:
+            prices: One price path, or a list of paths (e.g. sessions)
+            workers: Number of worker processes, defaults to the CPU count
+            chunksize: Combinations per task, derived from the grid if None
+        """
+        self.logger = logging.getLogger(__name__)
+        if prices and isinstance(prices[0], (int, float)):
+            prices = [prices]
+        self.price_paths = [path for path in prices if len(path) > 0]
+        if not self.price_paths:
+            raise ValueError("At least one non-empty price path is required")
+
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+
+    @classmethod
+    def from_bars(cls, builder, timeframe: Union[int, str], field: str = "close",
+                  **kwargs) -> 'ParameterSweep':
+        """Create a sweep over one column of a BarBuilder timeframe."""
+        return cls(builder.window(timeframe, field), **kwargs)
+
+    def _build_block(self) -> Tuple[shared_memory.SharedMemory, List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        Write prices and their min/max tree straight into a shared block.
+
+        Levels above the longest path are skipped, as no query spans a
+        whole block of that size. Each level is computed from the one
+        below it inside the shared block, so no full copies are kept.
+        """
+        total = sum(len(path) for path in self.price_paths)
+        longest = max(len(path) for path in self.price_paths)
+
+        lengths = []
+        size = FANOUT
+        while size <= longest:
+            lengths.append(-(-total // size))
+            size *= FANOUT
+
+        layout = [(0, total)]
+        for length in lengths + lengths:
+            offset, previous = layout[-1]
+            layout.append((offset + previous, length))
+        offset, length = layout[-1]
+
+        shm = shared_memory.SharedMemory(create=True, size=(offset + length) * 8)
+        view = shm.buf.cast('d')
+        try:
+            paths = []
+            pos = 0
+            for path in self.price_paths:
+                view[pos:pos + len(path)] = array('d', path)
+                paths.append((pos, pos + len(path)))
+                pos += len(path)
+
+            levels = len(lengths)
+            for reduce, first in ((min, 1), (max, levels + 1)):
+                below = layout[0]
+                for k in range(levels):
+                    start, count = layout[first + k]
+                    lower, lower_count = below
+                    for j in range(count):
+                        lo = lower + j * FANOUT
+                        view[start + j] = reduce(view[lo:min(lo + FANOUT, lower + lower_count)])
+                    below = layout[first + k]
+        finally:
+            view.release()
+        return shm, layout, paths
+
+    def run(self, base: Sequence[float], extreme: Sequence[float], target: Sequence[float],
+            size: Sequence[float] = (0.01,), entry_methods: Sequence[str] = ENTRY_METHODS,
+            sort_by: str = "expectancy", top: Optional[int] = None) -> List[SweepResult]:
+        """
+        Evaluate every combination of the given parameter values.
+
+        Combinations whose Target and Extreme are not on opposite sides of
+        Base are skipped. Side is inferred: Target above Base is a buy.
+
+        Args:
+            base, extreme, target, size: Values to sweep for each input
+            entry_methods: Subset of EM1, EM2 and EM3
+            sort_by: SweepResult field to rank by; 'max_drawdown' and 'mae'
+                rank ascending, everything else descending
+            top: Only return the best ``top`` results if given
+
+        Returns:
+            Ranked list of SweepResult
+        """
+        unknown = set(entry_methods) - set(ENTRY_METHODS)
+        if unknown:
+            raise ValueError(f"Unknown entry method(s): {', '.join(sorted(unknown))}")
+        if sort_by not in SweepResult.__dataclass_fields__:
+            raise ValueError(f"Unknown sort field: {sort_by}")
+
+        grid = [list(base), list(extreme), list(target), list(size), list(entry_methods)]
+        combinations = math.prod(len(axis) for axis in grid)
+        if combinations == 0:
+            return []
+
+        workers = min(self.workers, combinations)
+        chunksize = self.chunksize or max(1, math.ceil(combinations / (workers * 8)))
+        chunks = [(i, min(i + chunksize, combinations)) for i in range(0, combinations, chunksize)]
+        self.logger.info(f"Sweeping {combinations} combinations over {len(self.price_paths)} "
+                         f"path(s) with {workers} worker(s), {len(chunks)} chunk(s)")
+
+        shm, layout, paths = self._build_block()
+        try:
+            init_args = (shm.name, layout, paths, grid)
+            if workers == 1:
+                _init_worker(*init_args)
+                batches = map(_run_chunk, chunks)
+                results = list(itertools.chain.from_iterable(batches))
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=init_args) as pool:
+                    batches = pool.map(_run_chunk, chunks)
+                    results = list(itertools.chain.from_iterable(batches))
+        finally:
+            if workers == 1:
+                _release_worker()
+            shm.close()
+            shm.unlink()
+
+        ascending = sort_by in ("max_drawdown", "mae")
+        results.sort(key=lambda r: getattr(r, sort_by), reverse=not ascending)
+        return results[:top] if top else results
+
+def format_results(results: List[SweepResult], top: int = 20) -> str:
+    """Render the best ``top`` results as a fixed-width text table."""
+    header = (f"{'#':>4} {'Base':>10} {'Extreme':>10} {'Target':>10} {'Size':>6} {'EM':>4} "
+              f"{'Side':>4} {'Fill%':>6} {'R:R':>6} {'Win%':>6} {'Exp(R)':>7} {'PnL':>10} {'MaxDD':>10}")
+    lines = [header, "-" * len(header)]
+    for rank, r in enumerate(results[:top], 1):
+        lines.append(
+            f"{rank:>4} {r.base:>10.5f} {r.extreme:>10.5f} {r.target:>10.5f} {r.size:>6.2f} "
+            f"{r.entry_method:>4} {r.side:>4} {r.fill_rate * 100:>6.1f} {r.rr:>6.2f} "
+            f"{r.win_rate * 100:>6.1f} {r.expectancy:>7.2f} {r.pnl:>10.5f} {r.max_drawdown:>10.5f}"
+        )
+    return "\n".join(lines)
+
+def results_to_dicts(results: List[SweepResult]) -> List[Dict[str, Any]]:
+    """Convert results to plain dictionaries, e.g. for JSON or CSV export."""
+    return [asdict(r) for r in results]
+
+def parse_values(text: str) -> List[float]:
+    """Parse 'start:stop:step' as an inclusive range, or 'a,b,c' as a list."""
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        return frange(start, stop, step)
+    return [float(part) for part in text.split(",")]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Parameter sweep for MM2 entry methods")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--prices", help="Recorded prices, JSON or CSV file")
+    source.add_argument("--simulate", metavar="PATHSxTICKS", help="Random-walk paths, e.g. 40x2000")
+    parser.add_argument("--column", help="CSV price column (default: price/close/last/bid)")
+    parser.add_argument("--group", help="CSV column splitting the file into paths, e.g. date")
+    parser.add_argument("--start", type=float, default=1.0, help="Start price for --simulate")
+    parser.add_argument("--volatility", type=float, default=0.0005, help="Per-tick volatility for --simulate")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--base", type=parse_values, required=True, help="start:stop:step or a,b,c")
+    parser.add_argument("--extreme", type=parse_values, required=True)
+    parser.add_argument("--target", type=parse_values, required=True)
+    parser.add_argument("--size", type=parse_values, default=[0.01])
+    parser.add_argument("--methods", default=",".join(ENTRY_METHODS), help="e.g. EM1,EM3")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--sort-by", default="expectancy")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--output", help="Write all ranked results to this JSON file")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if args.prices:
+        prices = load_prices(args.prices, args.column, args.group)
+    else:
+        count, _, length = args.simulate.lower().partition("x")
+        prices = simulate_paths(int(count), int(length), args.start, args.volatility, args.seed)
+
+    sweep = ParameterSweep(prices, workers=args.workers, chunksize=args.chunksize)
+    results = sweep.run(args.base, args.extreme, args.target, args.size,
+                        [m.strip().upper() for m in args.methods.split(",")], sort_by=args.sort_by)
+    print(format_results(results, args.top))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results_to_dicts(results), f, indent=4)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+# MM2/src/client/models/bars.py
+import logging
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from models.market_data import MarketData
+
+# Suffix multipliers accepted by parse_timeframe ("1s", "1m", "5m", "4h", "1d")
+TIMEFRAME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_timeframe(timeframe: Union[int, float, str]) -> int:
+    """Convert a timeframe such as 60, "1m" or "15s" to whole seconds."""
+    if isinstance(timeframe, (int, float)):
+        seconds = int(timeframe)
+    else:
+        text = str(timeframe).strip().lower()
+        unit = TIMEFRAME_UNITS.get(text[-1:])
+        try:
+            seconds = int(text[:-1]) * unit if unit else int(text)
+        except ValueError:
+            raise ValueError(f"Invalid timeframe: {timeframe}")
+
+    if seconds <= 0:
+        raise ValueError(f"Timeframe must be positive: {timeframe}")
+    return seconds
+
+def format_timeframe(seconds: int) -> str:
+    """Render a timeframe in seconds using the largest whole unit."""
+    for suffix, size in sorted(TIMEFRAME_UNITS.items(), key=lambda x: -x[1]):
+        if seconds % size == 0:
+            return f"{seconds // size}{suffix}"
+    return f"{seconds}s"
+
+@dataclass
+class Bar:
+    """A single OHLCV bar with tick and spread statistics."""
+    start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    tick_count: int
+    spread_avg: float
+    spread_min: float
+    spread_max: float
+
+class BarSeries:
+    """
+    Fixed-capacity ring of bars for one timeframe.
+
+    All columns are preallocated ``array('d')`` buffers so that a tick only
+    touches a handful of slots and never allocates. The bar being built is
+    always the newest slot; closed bars are overwritten once ``capacity``
+    is exceeded.
+    """
+
+    FIELDS = ("start", "open", "high", "low", "close", "volume",
+              "tick_count", "spread_ticks", "spread_sum", "spread_min", "spread_max")
+
+    def __init__(self, seconds: int, capacity: int = 1000):
+        """
+        Initialize an empty series.
+
+        Args:
+            seconds: Bar length in seconds
+            capacity: Number of bars (including the open one) to retain
+        """
+        if capacity <= 0:
+            raise ValueError(f"Capacity must be positive: {capacity}")
+
+        self.seconds = seconds
+        self.capacity = capacity
+        self.columns = {name: array('d', bytes(8 * capacity)) for name in self.FIELDS}
+        self.head = -1     # Slot of the bar currently being built
+        self.count = 0     # Number of populated slots
+        self.bucket = None # Bucket index (start // seconds) of the open bar
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def label(self) -> str:
+        """Human readable timeframe, e.g. '5m'."""
+        return format_timeframe(self.seconds)
+
+    def is_late(self, ts: float) -> bool:
+        """Whether ``ts`` belongs to a bar that is already closed."""
+        return self.bucket is not None and int(ts // self.seconds) < self.bucket
+
+    def update(self, ts: float, price: float, volume: float = 0.0,
+               spread: Optional[float] = None) -> bool:
+        """
+        Fold a single tick into the series.
+
+        Args:
+            ts: Tick time as a POSIX timestamp
+            price: Tick price (last trade or mid)
+            volume: Traded volume attributed to this tick
+            spread: Bid-ask spread at the tick, if known
+
+        Returns:
+            True if the tick opened a new bar, False otherwise
+        """
+        bucket = int(ts // self.seconds)
+        cols = self.columns
+
+        if self.is_late(ts):
+            return False
+
+        if bucket != self.bucket:
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.bucket = bucket
+            i = self.head
+            cols["start"][i] = bucket * self.seconds
+            cols["open"][i] = cols["high"][i] = cols["low"][i] = cols["close"][i] = price
+            cols["volume"][i] = volume
+            cols["tick_count"][i] = 1
+            if spread is None:
+                # No spread samples yet: all spread stats read as 0.0
+                cols["spread_ticks"][i] = 0
+                cols["spread_sum"][i] = cols["spread_min"][i] = cols["spread_max"][i] = 0.0
+            else:
+                cols["spread_ticks"][i] = 1
+                cols["spread_sum"][i] = cols["spread_min"][i] = cols["spread_max"][i] = spread
+            return True
+
+        i = self.head
+        if price > cols["high"][i]:
+            cols["high"][i] = price
+        if price < cols["low"][i]:
+            cols["low"][i] = price
+        cols["close"][i] = price
+        cols["volume"][i] += volume
+        cols["tick_count"][i] += 1
+        if spread is not None:
+            if not cols["spread_ticks"][i]:
+                cols["spread_min"][i] = cols["spread_max"][i] = spread
+            elif spread < cols["spread_min"][i]:
+                cols["spread_min"][i] = spread
+            elif spread > cols["spread_max"][i]:
+                cols["spread_max"][i] = spread
+            cols["spread_ticks"][i] += 1
+            cols["spread_sum"][i] += spread
+        return False
+
+    def _slots(self, count: Optional[int] = None, closed_only: bool = False) -> List[int]:
+        """Ring slots of the newest ``count`` bars in chronological order."""
+        available = self.count - 1 if closed_only else self.count
+        n = available if count is None else max(0, min(count, available))
+        last = self.head - 1 if closed_only else self.head
+        return [(last - k) % self.capacity for k in range(n - 1, -1, -1)]
+
+    def window(self, field: str, count: Optional[int] = None,
+               closed_only: bool = False) -> List[float]:
+        """
+        Return one column for the newest ``count`` bars, oldest first.
+
+        Args:
+            field: One of FIELDS, or 'spread_avg'
+            count: Number of bars to return, all retained bars if None
+            closed_only: Exclude the bar that is still being built
+        """
+        slots = self._slots(count, closed_only)
+        if field == "spread_avg":
+            sums, ticks = self.columns["spread_sum"], self.columns["spread_ticks"]
+            return [sums[i] / ticks[i] if ticks[i] else 0.0 for i in slots]
+        column = self.columns[field]
+        return [column[i] for i in slots]
+
+    def _bar(self, i: int) -> Bar:
+        cols = self.columns
+        spread_ticks = cols["spread_ticks"][i]
+        return Bar(
+            start=datetime.fromtimestamp(cols["start"][i]),
+            open=cols["open"][i],
+            high=cols["high"][i],
+            low=cols["low"][i],
+            close=cols["close"][i],
+            volume=cols["volume"][i],
+            tick_count=int(cols["tick_count"][i]),
+            spread_avg=cols["spread_sum"][i] / spread_ticks if spread_ticks else 0.0,
+            spread_min=cols["spread_min"][i],
+            spread_max=cols["spread_max"][i],
+        )
+
+    def history(self, count: Optional[int] = None, closed_only: bool = False) -> List[Bar]:
+        """Return the newest ``count`` bars as Bar objects, oldest first."""
+        return [self._bar(i) for i in self._slots(count, closed_only)]
+
+    @property
+    def current(self) -> Optional[Bar]:
+        """The bar currently being built, or None if no tick was seen."""
+        return self._bar(self.head) if self.count else None
+
+class BarBuilder:
+    """
+    Aggregates the MarketData update stream into bars for several timeframes.
+
+    Every tick is folded into each configured BarSeries as it arrives, so
+    consumers can read finished bars instead of re-aggregating raw ticks.
+    Bars are only created when ticks arrive; quiet periods leave no bars.
+    """
+
+    def __init__(self, timeframes: Iterable[Union[int, str]] = ("1s", "1m", "5m"),
+                 capacity: int = 1000):
+        """
+        Initialize the builder.
+
+        Args:
+            timeframes: Timeframes to build, as seconds or strings like '5m'
+            capacity: Number of bars retained per timeframe
+        """
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.series: Dict[int, BarSeries] = {}
+        for timeframe in timeframes:
+            seconds = parse_timeframe(timeframe)
+            self.series.setdefault(seconds, BarSeries(seconds, capacity))
+        if not self.series:
+            raise ValueError("At least one timeframe is required")
+
+        self.last_trade_ts = None   # Timestamp of the newest trade already folded in
+        self.boundary_trades = {}   # Key -> count of folded trades at exactly last_trade_ts
+        self.late_ticks = 0         # Ticks rejected for arriving after their bar closed
+
+    def __getitem__(self, timeframe: Union[int, str]) -> BarSeries:
+        """Look up a series by timeframe, e.g. builder['1m']."""
+        return self.series[parse_timeframe(timeframe)]
+
+    @property
+    def timeframes(self) -> List[str]:
+        """Configured timeframes, shortest first."""
+        return [self.series[s].label for s in sorted(self.series)]
+
+    def add_tick(self, ts: Union[float, datetime], price: float, volume: float = 0.0,
+                 spread: Optional[float] = None) -> List[str]:
+        """
+        Fold a raw tick into every timeframe.
+
+        Returns:
+            Labels of the timeframes that rolled over to a new bar
+        """
+        with self.lock:
+            return self._add_tick(ts, price, volume, spread)
+
+    def _add_tick(self, ts: Union[float, datetime], price: float, volume: float,
+                  spread: Optional[float]) -> List[str]:
+        """add_tick without locking; the caller must hold self.lock."""
+        if isinstance(ts, datetime):
+            ts = ts.timestamp()
+
+        # Reject late ticks for every timeframe, so the series stay consistent
+        if any(series.is_late(ts) for series in self.series.values()):
+            self.late_ticks += 1
+            self.logger.debug(f"Dropping late tick at {ts} ({self.late_ticks} so far)")
+            return []
+
+        rolled = []
+        for series in self.series.values():
+            if series.update(ts, price, volume, spread):
+                rolled.append(series.label)
+        return rolled
+
+    def add_quote(self, ts: Union[float, datetime], bid: float, ask: float,
+                  last: Optional[float] = None, volume: float = 0.0) -> List[str]:
+        """Fold a bid/ask quote, as returned by the 'refresh' command."""
+        price = float(last) if last is not None else (float(bid) + float(ask)) / 2
+        return self.add_tick(ts, price, volume, float(ask) - float(bid))
+
+    def update(self, market_data: MarketData) -> List[str]:
+        """
+        Fold a MarketData snapshot into every timeframe.
+
+        Each trade in ``recent_trades`` not seen in an earlier snapshot is
+        folded in as its own tick at the trade's time, price and size.
+        Trades are matched by ``trade_id`` when present, otherwise by price,
+        size and side, counting repeats that share a timestamp. If the
+        snapshot holds no new trades, a single tick at the last trade (or
+        mid) price is added at the snapshot time.
+        """
+        book = market_data.order_book
+        spread = book.spread if market_data.is_valid else None
+
+        with self.lock:
+            rolled = []
+            prev_ts, prev_counts = self.last_trade_ts, self.boundary_trades
+            newest_ts, newest_counts = prev_ts, {}  # Key -> occurrences at newest_ts
+            new_trades = 0
+            for trade in sorted(market_data.recent_trades, key=lambda t: t.timestamp):
+                trade_ts = trade.timestamp.timestamp()
+                key = trade.trade_id if trade.trade_id is not None else (trade.price, trade.size, trade.side)
+                if prev_ts is not None and trade_ts < prev_ts:
+                    continue
+
+                if trade_ts != newest_ts:
+                    newest_ts, newest_counts = trade_ts, {}
+                newest_counts[key] = newest_counts.get(key, 0) + 1
+
+                # Only trades at the previous boundary can repeat earlier ones
+                if trade_ts == prev_ts and newest_counts[key] <= prev_counts.get(key, 0):
+                    continue
+
+                new_trades += 1
+                rolled.extend(self._add_tick(trade_ts, trade.price, trade.size, spread))
+
+            if newest_ts == prev_ts:
+                for key, count in prev_counts.items():
+                    newest_counts[key] = max(newest_counts.get(key, 0), count)
+            self.last_trade_ts, self.boundary_trades = newest_ts, newest_counts
+
+            if new_trades:
+                return list(dict.fromkeys(rolled))
+
+            if market_data.last_trade is not None:
+                price = market_data.last_trade.price
+            elif market_data.is_valid:
+                price = book.mid_price
+            else:
+                self.logger.debug(f"Skipping snapshot without price for {market_data.symbol}")
+                return []
+
+            return self._add_tick(market_data.timestamp, price, 0.0, spread)
+
+    def history(self, timeframe: Union[int, str], count: Optional[int] = None,
+                closed_only: bool = False) -> List[Bar]:
+        """Return recent bars for a timeframe, oldest first."""
+        with self.lock:
+            return self[timeframe].history(count, closed_only)
+
+    def window(self, timeframe: Union[int, str], field: str, count: Optional[int] = None,
+               closed_only: bool = False) -> List[float]:
+        """Return a single column (e.g. 'close') for a timeframe, oldest first."""
+        with self.lock:
+            return self[timeframe].window(field, count, closed_only)
@@ -69,6 +69,8 @@ class Trade:
         self.size = float(self.size)
         if self.timestamp is None:
             self.timestamp = datetime.now()
+        elif isinstance(self.timestamp, (int, float)):
+            self.timestamp = datetime.fromtimestamp(self.timestamp)
 
 @dataclass
 class MarketData: